@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from fastapi import HTTPException
+
+
+# Heavy computations running across all governors, and the most seen at once
+# since the last reset_overlap(); lets a profile report what it overlapped.
+_activity_lock = threading.Lock()
+_running = 0
+_overlap_peak = 0
+
+
+def _enter_running():
+    global _running, _overlap_peak
+    with _activity_lock:
+        _running += 1
+        _overlap_peak = max(_overlap_peak, _running)
+
+
+def _exit_running():
+    global _running
+    with _activity_lock:
+        _running -= 1
+
+
+def reset_overlap() -> None:
+    global _overlap_peak
+    with _activity_lock:
+        _overlap_peak = _running
+
+
+def overlap_peak() -> int:
+    with _activity_lock:
+        return _overlap_peak
+
+
+@dataclass
+class Admission:
+    result: Any
+    queue_wait_ms: int
+    coalesced: bool
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.queue_wait_ms = 0
+
+
+class Governor:
+    """Bounded concurrency with a queue limit and single-flight coalescing.
+
+    At most `max_concurrent` computations run at once and at most `max_queue`
+    more wait for a slot; beyond that callers get 429 + Retry-After. Callers
+    with the same key as an in-flight computation wait for and share its
+    result instead of taking a slot; they still hold a worker thread, so at
+    most `max_concurrent + max_queue` of them may wait before they get 429 too.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, retry_after_seconds: int):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.retry_after_seconds = retry_after_seconds
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._pending = 0  # running + queued leaders
+        self._followers = 0  # callers waiting on another caller's computation
+        self._inflight: Dict[Hashable, _Flight] = {}
+
+    def _reject(self):
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many concurrent {self.name} requests; retry later",
+            headers={"Retry-After": str(self.retry_after_seconds)},
+        )
+
+    def run(self, key: Optional[Hashable], fn: Callable[[], Any]) -> Admission:
+        start = time.perf_counter()
+        limit = self.max_concurrent + self.max_queue
+        with self._lock:
+            flight = self._inflight.get(key) if key is not None else None
+            leader = flight is None
+            if leader:
+                if self._pending >= limit:
+                    self._reject()
+                self._pending += 1
+                flight = _Flight()
+                if key is not None:
+                    self._inflight[key] = flight
+            else:
+                if self._followers >= limit:
+                    self._reject()
+                self._followers += 1
+
+        if not leader:
+            try:
+                flight.done.wait()
+            finally:
+                with self._lock:
+                    self._followers -= 1
+            if flight.error is not None:
+                raise flight.error
+            # The leader's wait for a slot; the follower's own wait is its compute time
+            return Admission(flight.result, flight.queue_wait_ms, True)
+
+        try:
+            self._slots.acquire()
+            wait_ms = int((time.perf_counter() - start) * 1000)
+            flight.queue_wait_ms = wait_ms
+            _enter_running()
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                _exit_running()
+                self._slots.release()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if key is not None:
+                    self._inflight.pop(key, None)
+            flight.done.set()
+        return Admission(flight.result, wait_ms, False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "followers": self._followers,
+                "inflightKeys": len(self._inflight),
+                "maxConcurrent": self.max_concurrent,
+                "maxQueue": self.max_queue,
+            }
@@ -20,9 +20,34 @@ class Settings(BaseModel):
     aws_region: str = os.getenv("AWS_REGION", "us-east-1")
     aws_s3_bucket_uploads: str | None = os.getenv("AWS_S3_BUCKET_UPLOADS")
 
+    # Input storage: "s3" (default) or "local" (files under LOCAL_STORAGE_ROOT)
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "s3")
+    local_storage_root: str | None = os.getenv("LOCAL_STORAGE_ROOT")
+
     # Supabase Postgres
     supabase_db_url: str | None = os.getenv("SUPABASE_DB_URL")
 
+    # Optional JSON file with lane weight rules (list of WeightRule objects)
+    weight_rules_path: str | None = os.getenv("WEIGHT_RULES_PATH")
+
+    # Opt-in per-request profiling (X-Profile: 1 or ?profile=1)
+    profiling_enabled: bool = os.getenv(
+        "PROFILING_ENABLED", "false").lower() in {"1", "true", "yes"}
+    profile_dir: str | None = os.getenv("PROFILE_DIR")
+    profile_max_keep: int = int(os.getenv("PROFILE_MAX_KEEP", "50"))
+
+    # Admission control for heavy endpoints
+    max_concurrent_optimizations: int = int(
+        os.getenv("MAX_CONCURRENT_OPTIMIZATIONS", "2"))
+    max_concurrent_parses: int = int(os.getenv("MAX_CONCURRENT_PARSES", "4"))
+    max_queue_depth: int = int(os.getenv("MAX_QUEUE_DEPTH", "8"))
+    retry_after_seconds: int = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+    # Total assignments (across runs) kept in memory for /runs queries;
+    # roughly 4.5 KB each including indexes
+    run_store_max_assignments: int = int(
+        os.getenv("RUN_STORE_MAX_ASSIGNMENTS", "500000"))
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import csv
 import io
+import zlib
+from typing import Iterable, Iterator, List, Sequence, Type
 
-from .optimizer import _load_excel_from_s3
+from pydantic import BaseModel
 
 
 def export_trucks_workbook(s3_key: str, sheet_name: str | None):
@@ -47,3 +50,61 @@ def export_dh_load_list_workbook(s3_key: str, sheet_name: str | None):
     wb.save(out)
     out.seek(0)
     return out
+
+
+STREAM_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+# Rows serialized per yielded chunk; keeps writes large without buffering the run
+STREAM_BATCH_ROWS = 500
+
+
+def stream_columns(model: Type[BaseModel]) -> List[str]:
+    """Stable column order: the model's declared field order."""
+    return list(model.model_fields.keys())
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _encode_rows(rows: Iterable[BaseModel], columns: Sequence[str], fmt: str) -> Iterator[str]:
+    buf = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(columns)
+    n = 0
+    for row in rows:
+        if fmt == "csv":
+            writer.writerow([_csv_value(getattr(row, c)) for c in columns])
+        else:
+            buf.write(row.model_dump_json())
+            buf.write("\n")
+        n += 1
+        if n % STREAM_BATCH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def stream_rows(rows: Iterable[BaseModel], model: Type[BaseModel], fmt: str,
+                gzip: bool = False) -> Iterator[bytes]:
+    """Serialize rows incrementally as CSV or NDJSON, optionally gzip-compressed."""
+    columns = stream_columns(model)
+    encoder = zlib.compressobj(wbits=31) if gzip else None  # 31 -> gzip container
+    for chunk in _encode_rows(rows, columns, fmt):
+        data = chunk.encode("utf-8")
+        if encoder is None:
+            yield data
+        else:
+            # Sync-flush each batch so the client gets data as it is produced
+            yield encoder.compress(data) + encoder.flush(zlib.Z_SYNC_FLUSH)
+    if encoder is not None:
+        yield encoder.flush()
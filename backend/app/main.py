@@ -3,25 +3,46 @@ from __future__ import annotations
 import io
 import json
 import time
+from contextlib import asynccontextmanager
 from typing import List, Optional
 
-import boto3
-import psycopg
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+# pandas, openpyxl, boto3 and psycopg (via optimizer/preview/exporter) are
+# imported lazily inside handlers and warmed in the background at startup,
+# so /health is served after a minimal import.
 from .config import get_settings
-from .preview import generate_preview, PreviewResponse, PreviewRequest
-from .models import OptimizeRequest, OptimizeResponse
-from .optimizer import optimize
+from .models import (AssignmentPage, LineAssignment, OptimizeRequest, OptimizeResponse,
+                     PreviewRequest, PreviewResponse, TruckDetail, TruckPage, TruckSummary)
 from .constants import NO_MULTI_STOP_CUSTOMERS
-from fastapi.responses import StreamingResponse
-from .exporter import export_trucks_workbook, export_dh_load_list_workbook
+from fastapi.responses import FileResponse, StreamingResponse
+from . import warmup
+from .profiling import profile_headers, profile_paths, profiling_requested, run_profiled
+from .concurrency import Admission, Governor
+from .runs import RunStore
 
 settings = get_settings()
 
-app = FastAPI(title="Truck Planner API", version="0.1.0")
+# Heavy endpoints: bounded concurrency, bounded queue, identical requests coalesced
+optimize_governor = Governor("optimize", settings.max_concurrent_optimizations,
+                             settings.max_queue_depth, settings.retry_after_seconds)
+parse_governor = Governor("parse", settings.max_concurrent_parses,
+                          settings.max_queue_depth, settings.retry_after_seconds)
+
+# Recent optimization results, indexed for /runs queries
+run_store = RunStore(settings.run_store_max_assignments)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    warmup.start_warmup()
+    yield
+
+
+app = FastAPI(title="Truck Planner API", version="0.1.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -40,16 +61,32 @@ class Health(BaseModel):
     env: str
 
 
+# Liveness/load probes run on the event loop, not the threadpool, so they still
+# answer while every worker thread is busy with heavy requests
 @app.get("/health", response_model=Health)
-def health() -> Health:
+async def health() -> Health:
     return Health(status="ok", env=settings.app_env)
 
 
+@app.get("/ready")
+async def ready():
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/health/load")
+async def health_load():
+    return {"optimize": optimize_governor.stats(), "parse": parse_governor.stats(),
+            "runs": run_store.stats()}
+
+
 @app.get("/db/ping")
 def db_ping():
     if not settings.supabase_db_url:
         raise HTTPException(
             status_code=503, detail="SUPABASE_DB_URL not configured")
+    import psycopg
+
     try:
         with psycopg.connect(settings.supabase_db_url, connect_timeout=5) as conn:
             with conn.cursor() as cur:
@@ -73,6 +110,8 @@ def presign_upload(req: PresignRequest):
         raise HTTPException(
             status_code=503, detail="AWS_S3_BUCKET_UPLOADS not configured")
 
+    import boto3
+
     s3 = boto3.client("s3", region_name=settings.aws_region)
     # Key format: prefix/timestamp-filename to avoid collisions
     ts = int(time.time())
@@ -92,20 +131,61 @@ def presign_upload(req: PresignRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _flight_key(name: str, req: BaseModel, request: Request) -> Optional[tuple]:
+    from .storage import get_storage
+
+    # Profiled requests run on their own so each gets its own profile
+    if profiling_requested(request):
+        return None
+    # Include the file version so a re-upload under the same key is not
+    # served from a flight that read the old file
+    return (name, req.model_dump_json(), get_storage().cache_key(req.s3_key))
+
+
+def _queue_headers(response: Response, admission: Admission):
+    response.headers["X-Queue-Wait-Ms"] = str(admission.queue_wait_ms)
+    if admission.coalesced:
+        response.headers["X-Coalesced"] = "1"
+
+
 @app.post("/upload/preview", response_model=PreviewResponse)
-def upload_preview(req: PreviewRequest):
+def upload_preview(req: PreviewRequest, request: Request, response: Response):
+    from .preview import generate_preview
+
     try:
-        return generate_preview(req)
+        admission = parse_governor.run(
+            _flight_key("preview", req, request),
+            lambda: run_profiled(request, response, "upload_preview", generate_preview, req))
+        _queue_headers(response, admission)
+        return admission.result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _optimize_and_store(req: OptimizeRequest) -> OptimizeResponse:
+    from .optimizer import optimize
+
+    result = optimize(req)
+    # None when the run alone is over the store budget; it is still returned
+    result.runId = run_store.add(result)
+    return result
+
+
 @app.post("/optimize", response_model=OptimizeResponse)
-def optimize_endpoint(req: OptimizeRequest):
+def optimize_endpoint(req: OptimizeRequest, request: Request, response: Response):
     try:
-        return optimize(req)
+        admission = optimize_governor.run(
+            _flight_key("optimize", req, request),
+            lambda: run_profiled(request, response, "optimize", _optimize_and_store, req))
+        result = admission.result
+        # Coalesced callers share one result object; give each its own metrics
+        return result.model_copy(update={"metrics": {
+            **result.metrics,
+            "queue_wait_ms": admission.queue_wait_ms,
+            "coalesced": admission.coalesced,
+        }})
     except HTTPException:
         raise
     except Exception as e:
@@ -138,21 +218,120 @@ class ExportRequest(BaseModel):
     sheet_name: Optional[str] = None
 
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _export_workbook(name: str, builder, filename: str, req: ExportRequest,
+                     request: Request, response: Response):
+    # Share the finished bytes so coalesced callers each get a fresh stream
+    admission = parse_governor.run(
+        _flight_key(name, req, request),
+        lambda: run_profiled(request, response, name,
+                             lambda: builder(req.s3_key, req.sheet_name).getvalue()))
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    headers.update(profile_headers(response))
+    stream = StreamingResponse(io.BytesIO(admission.result),
+                               media_type=XLSX_MEDIA_TYPE, headers=headers)
+    _queue_headers(stream, admission)
+    return stream
+
+
 @app.post("/export/trucks")
-def export_trucks(req: ExportRequest):
+def export_trucks(req: ExportRequest, request: Request, response: Response):
+    from .exporter import export_trucks_workbook
+
     try:
-        wb = export_trucks_workbook(req.s3_key, req.sheet_name)
-        return StreamingResponse(wb, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                 headers={"Content-Disposition": "attachment; filename=truck_optimization_results.xlsx"})
+        return _export_workbook("export_trucks", export_trucks_workbook,
+                                "truck_optimization_results.xlsx", req, request, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/export/dh-load-list")
-def export_dh(req: ExportRequest):
+def export_dh(req: ExportRequest, request: Request, response: Response):
+    from .exporter import export_dh_load_list_workbook
+
     try:
-        wb = export_dh_load_list_workbook(req.s3_key, req.sheet_name)
-        return StreamingResponse(wb, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                 headers={"Content-Disposition": "attachment; filename=dh_load_list.xlsx"})
+        return _export_workbook("export_dh_load_list", export_dh_load_list_workbook,
+                                "dh_load_list.xlsx", req, request, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/runs/{run_id}/assignments", response_model=AssignmentPage)
+def query_run_assignments(run_id: str, so: Optional[str] = None, line: Optional[str] = None,
+                          customer: Optional[str] = None, truck: Optional[int] = None,
+                          bucket: Optional[str] = None, zone: Optional[str] = None,
+                          route: Optional[str] = None, section: Optional[str] = None,
+                          offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    run = run_store.get(run_id)
+    positions = run.assignments(so=so, line=line, customer=customer, truck=truck,
+                                bucket=bucket, zone=zone, route=route, section=section)
+    items = list(run.assignments_table.rows(positions[offset:offset + limit]))
+    return AssignmentPage(runId=run_id, total=len(positions), offset=offset, limit=limit, items=items)
+
+
+@app.get("/runs/{run_id}/trucks", response_model=TruckPage)
+def query_run_trucks(run_id: str, customer: Optional[str] = None, bucket: Optional[str] = None,
+                     zone: Optional[str] = None, route: Optional[str] = None,
+                     offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    run = run_store.get(run_id)
+    positions = run.trucks(customer=customer, bucket=bucket, zone=zone, route=route)
+    items = list(run.trucks_table.rows(positions[offset:offset + limit]))
+    return TruckPage(runId=run_id, total=len(positions), offset=offset, limit=limit, items=items)
+
+
+@app.get("/runs/{run_id}/trucks/{truck_number}", response_model=TruckDetail)
+def get_run_truck(run_id: str, truck_number: int):
+    truck, lines = run_store.get(run_id).truck(truck_number)
+    return TruckDetail(truck=truck, assignments=lines)
+
+
+def _stream_export(run_id: str, kind: str, items, model, fmt: str, gzip: bool):
+    from .exporter import STREAM_FORMATS, stream_rows
+
+    if fmt not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {sorted(STREAM_FORMATS)}")
+    media_type, ext = STREAM_FORMATS[fmt]
+    filename = f"{run_id}-{kind}.{ext}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(stream_rows(items, model, fmt, gzip), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
+@app.get("/runs/{run_id}/export/assignments")
+def stream_run_assignments(run_id: str, format: str = "csv", gzip: bool = False,
+                           section: Optional[str] = None, bucket: Optional[str] = None):
+    run = run_store.get(run_id)
+    positions = run.assignments(section=section, bucket=bucket)
+    items = run.assignments_table.rows(positions)
+    return _stream_export(run_id, "assignments", items, LineAssignment, format, gzip)
+
+
+@app.get("/runs/{run_id}/export/trucks")
+def stream_run_trucks(run_id: str, format: str = "csv", gzip: bool = False,
+                      section: Optional[str] = None):
+    run = run_store.get(run_id)
+    positions = run.trucks(bucket=section)
+    items = run.trucks_table.rows(positions)
+    return _stream_export(run_id, "trucks", items, TruckSummary, format, gzip)
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    paths = profile_paths(profile_id)
+    return FileResponse(paths["pstats"], media_type="application/octet-stream",
+                        filename=f"{profile_id}.prof")
+
+
+@app.get("/profiles/{profile_id}/summary")
+def get_profile_summary(profile_id: str):
+    paths = profile_paths(profile_id)
+    with open(paths["summary"], "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -1,7 +1,50 @@
 from __future__ import annotations
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+
+class WeightRule(BaseModel):
+    """One row of the lane weight-limit table.
+
+    ``state`` may be ``"*"`` to act as a fallback; ``zone``, ``route`` and
+    ``permit_class`` are optional and narrow the rule when set.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    state: str
+    zone: Optional[str] = None
+    route: Optional[str] = None
+    permit_class: Optional[str] = None
+    min_weight: int = Field(..., ge=40000, le=100000)
+    max_weight: int = Field(..., ge=40000, le=100000)
+    load_target_pct: Optional[float] = Field(None, ge=0.8, le=1.0)
+
+    @field_validator("state")
+    @classmethod
+    def _normalize_state(cls, v: str) -> str:
+        v = (v or "").strip().upper()
+        if not v:
+            raise ValueError("state is required (use '*' for any state)")
+        return v
+
+    @field_validator("zone", "route", "permit_class")
+    @classmethod
+    def _normalize_optional(cls, v: Optional[str]) -> Optional[str]:
+        if v is None:
+            return None
+        v = str(v).strip()
+        return v or None
+
+    @model_validator(mode="after")
+    def _check_range(self) -> "WeightRule":
+        if self.min_weight > self.max_weight:
+            raise ValueError(
+                f"min_weight {self.min_weight} exceeds max_weight {self.max_weight} for {self.key()}")
+        return self
+
+    def key(self) -> tuple:
+        return (self.state, self.zone, self.route, self.permit_class)
 
 
 class WeightConfig(BaseModel):
@@ -10,6 +53,20 @@ class WeightConfig(BaseModel):
     other_max: int = Field(48000, ge=40000, le=100000)
     other_min: int = Field(44000, ge=40000, le=100000)
     load_target_pct: float = Field(0.98, ge=0.8, le=1.0)
+    # Optional per-lane overrides. For the same key they beat WEIGHT_RULES_PATH;
+    # TX/other values above beat the file too when the request sets them.
+    rules: List[WeightRule] = Field(default_factory=list)
+    permit_class: Optional[str] = None
+
+    @field_validator("rules")
+    @classmethod
+    def _unique_rules(cls, v: List[WeightRule]) -> List[WeightRule]:
+        seen = set()
+        for rule in v:
+            if rule.key() in seen:
+                raise ValueError(f"Duplicate weight rule for {rule.key()}")
+            seen.add(rule.key())
+        return v
 
 
 class OptimizeRequest(BaseModel):
@@ -59,6 +116,7 @@ class LineAssignment(BaseModel):
     isRemainder: bool
     parentLine: Optional[str] = None
     remainingPieces: Optional[int] = None
+    priorityBucket: Optional[str] = None
 
 
 class OptimizeResponse(BaseModel):
@@ -66,3 +124,61 @@ class OptimizeResponse(BaseModel):
     assignments: List[LineAssignment]
     sections: dict
     metrics: dict
+    # Set when the run is kept server-side for /runs/{runId} queries
+    runId: Optional[str] = None
+
+
+class AssignmentPage(BaseModel):
+    runId: str
+    total: int
+    offset: int
+    limit: int
+    items: List[LineAssignment]
+
+
+class TruckPage(BaseModel):
+    runId: str
+    total: int
+    offset: int
+    limit: int
+    items: List[TruckSummary]
+
+
+class TruckDetail(BaseModel):
+    truck: TruckSummary
+    assignments: List[LineAssignment]
+
+
+class PreviewRequest(BaseModel):
+    s3_key: str
+    sheet_name: Optional[str] = None
+    max_sample_rows: int = 5
+    include_analytics: bool = True
+    weight_config: Optional[WeightConfig] = None
+
+
+class AggregateStat(BaseModel):
+    lines: int
+    readyWeight: float
+
+
+class PreviewAnalytics(BaseModel):
+    # Warehouse and state keys are upper-cased; blanks appear as "(missing)"
+    byWarehouse: Dict[str, AggregateStat]
+    # {warehouse: {bucket: stat}}, matching /optimize's single planning_whse
+    byWarehouseBucket: Dict[str, Dict[str, AggregateStat]]
+    groupCount: int
+    groupCountByWarehouse: Dict[str, int]
+    # {warehouse: {state: trucks}}; lower bound, each destination group needs
+    # ceil(weight / state max) trucks
+    estimatedTrucksByWarehouseState: Dict[str, Dict[str, int]]
+    nonPositivePieces: int
+    unparseableDates: Dict[str, int]
+
+
+class PreviewResponse(BaseModel):
+    headers: List[str]
+    rowCount: int
+    missingRequiredColumns: List[str]
+    sample: List[Dict]
+    analytics: Optional[PreviewAnalytics] = None
@@ -1,37 +1,39 @@
 from __future__ import annotations
 
-import io
 import math
 import time
 from datetime import datetime, timedelta
 from typing import List, Tuple, Dict
 
-import boto3
+import numpy as np
 import pandas as pd
 from fastapi import HTTPException
 
-from .config import get_settings
+from .storage import get_storage
 from .models import OptimizeRequest, OptimizeResponse, TruckSummary, LineAssignment, WeightConfig
 from .utils import canonical_rename, normalize
 from .constants import REQUIRED_COLUMNS
+from .weight_rules import apply_weight_limits
 
 
-def _load_excel_from_s3(s3_key: str, sheet_name: str | None) -> pd.DataFrame:
-    settings = get_settings()
-    if not settings.aws_s3_bucket_uploads:
-        raise HTTPException(
-            status_code=503, detail="AWS_S3_BUCKET_UPLOADS not configured")
-    s3 = boto3.client("s3", region_name=settings.aws_region)
-    try:
-        obj = s3.get_object(Bucket=settings.aws_s3_bucket_uploads, Key=s3_key)
-        data = obj["Body"].read()
-        excel = pd.ExcelFile(io.BytesIO(data))
-        df = excel.parse(sheet_name) if sheet_name else excel.parse(
-            excel.sheet_names[0])
-        return df
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, detail=f"Failed to read Excel from S3: {e}")
+def _load_excel(key: str, sheet_name: str | None) -> pd.DataFrame:
+    # Storage backend (S3 or local mmap) is chosen by STORAGE_BACKEND
+    with get_storage().open(key) as fh:
+        try:
+            with pd.ExcelFile(fh) as excel:
+                return excel.parse(sheet_name) if sheet_name else excel.parse(
+                    excel.sheet_names[0])
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid Excel file: {e}")
+
+
+def _normalize_whse(values) -> pd.Series:
+    """Warehouse key as /optimize matches it: trimmed, upper-cased, Excel float
+    suffix dropped (28.0 -> 28); blank cells become NA."""
+    s = pd.Series(values).astype("string").str.strip().str.upper()
+    s = s.str.replace(r"^(-?\d+)\.0+$", r"\1", regex=True)
+    return s.mask(s == "")
 
 
 def _ensure_required_columns(df: pd.DataFrame):
@@ -41,30 +43,42 @@ def _ensure_required_columns(df: pd.DataFrame):
             status_code=400, detail=f"Missing required columns: {missing}")
 
 
+DATE_COLUMNS = ["Earliest Due", "Latest Due"]
+PRIORITY_BUCKETS = ["Late", "NearDue", "WithinWindow", "NotDue"]
+
+
 def _parse_dates(df: pd.DataFrame):
-    for col in ["Earliest Due", "Latest Due"]:
+    for col in DATE_COLUMNS:
         if col in df.columns:
             df[col] = pd.to_datetime(df[col], errors="coerce")
 
 
 def _assign_priority_buckets(df: pd.DataFrame, today: datetime) -> pd.DataFrame:
     # Buckets: Late, NearDue (<=3 days out), WithinWindow, NotDue
-    def bucket(row):
-        latest = row.get("Latest Due")
-        if pd.isna(latest):
-            return "NotDue"
-        if latest < today:
-            return "Late"
-        if latest <= today + timedelta(days=3):
-            return "NearDue"
-        return "WithinWindow"
-
-    df["priorityBucket"] = df.apply(bucket, axis=1)
+    if "Latest Due" in df.columns:
+        latest = df["Latest Due"]
+    else:
+        latest = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    df["priorityBucket"] = np.select(
+        [latest.isna(), latest < today, latest <= today + timedelta(days=3)],
+        ["NotDue", "Late", "NearDue"],
+        default="WithinWindow",
+    )
     df["priorityRank"] = df["priorityBucket"].map(
-        {"Late": 0, "NearDue": 1, "WithinWindow": 2, "NotDue": 3})
+        {b: i for i, b in enumerate(PRIORITY_BUCKETS)})
     return df
 
 
+def _group_keys(df: pd.DataFrame) -> List[str]:
+    # Grouping by zone/route/customer/destination
+    keys = []
+    if "Zone" in df.columns:
+        keys.append("Zone")
+    if "Route" in df.columns:
+        keys.append("Route")
+    return keys + ["Customer", "shipping_state", "shipping_city"]
+
+
 def _is_shippable(row, ship_date: datetime):
     ed = row.get("Earliest Due")
     ld = row.get("Latest Due")
@@ -74,12 +88,6 @@ def _is_shippable(row, ship_date: datetime):
     return ed <= ship_date <= ld
 
 
-def _weight_limits_for_state(state: str, cfg: WeightConfig) -> Tuple[int, int]:
-    if (state or "").strip().upper() == "TX":
-        return cfg.texas_min, cfg.texas_max
-    return cfg.other_min, cfg.other_max
-
-
 def _calc_weight_per_piece(row) -> float:
     rw = float(row.get("Ready Weight", 0) or 0)
     rpcs = int(row.get("RPcs", 0) or 0)
@@ -101,7 +109,7 @@ def _sort_for_packing(group_df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def _pack_trucks_for_group(group_df: pd.DataFrame, cfg: WeightConfig, allow_multi_stop: bool, ship_date: datetime) -> Tuple[List[TruckSummary], List[LineAssignment], List[int]]:
+def _pack_trucks_for_group(group_df: pd.DataFrame, allow_multi_stop: bool, ship_date: datetime) -> Tuple[List[TruckSummary], List[LineAssignment], List[int]]:
     # With allow_multi_stop False, only same customer on truck.
     # Cross-bucket fill allowed within exact destination (zone, route, customer, city, state) and shippable rule.
     trucks: List[TruckSummary] = []
@@ -113,10 +121,11 @@ def _pack_trucks_for_group(group_df: pd.DataFrame, cfg: WeightConfig, allow_mult
     if df.empty:
         return trucks, assignments, []
 
-    # Determine state limits from any row (same destination/customer assumed in group)
-    state = str(df.iloc[0]["shipping_state"]).strip().upper()
-    min_w, max_w = _weight_limits_for_state(state, cfg)
-    target = int(max_w * cfg.load_target_pct)
+    # Limits were joined onto every row up front; a group shares one lane
+    first_row = df.iloc[0]
+    min_w = int(first_row["minWeight"])
+    max_w = int(first_row["maxWeight"])
+    target = int(first_row["targetWeight"])
 
     # Prepare list of rows with piece-level info
     rows = []
@@ -193,6 +202,7 @@ def _pack_trucks_for_group(group_df: pd.DataFrame, cfg: WeightConfig, allow_mult
                     "width": width_val,
                     "is_overwidth": width_val > 96,
                     "is_late": r["priorityBucket"] == "Late",
+                    "bucket": r["priorityBucket"],
                     "earliest": r.get("Earliest Due"),
                     "latest": r.get("Latest Due"),
                     "is_partial": is_partial,
@@ -214,7 +224,6 @@ def _pack_trucks_for_group(group_df: pd.DataFrame, cfg: WeightConfig, allow_mult
         # Create truck summary
         first = current_lines[0]
         state = first["state"].upper()
-        min_w, max_w = _weight_limits_for_state(state, cfg)
         truck_summary = TruckSummary(
             truckNumber=next_truck_number,
             customerName=first["customer"],
@@ -263,6 +272,7 @@ def _pack_trucks_for_group(group_df: pd.DataFrame, cfg: WeightConfig, allow_mult
                 parentLine=cl["parent_line"],
                 remainingPieces=int(
                     cl["remaining_pieces"]) if cl["remaining_pieces"] is not None else None,
+                priorityBucket=cl["bucket"],
             ))
 
         # Record section index by priority
@@ -284,50 +294,35 @@ def _pack_trucks_for_group(group_df: pd.DataFrame, cfg: WeightConfig, allow_mult
 
 def optimize(req: OptimizeRequest) -> OptimizeResponse:
     start = time.time()
-    df = _load_excel_from_s3(req.s3_key, req.sheet_name)
+    df = _load_excel(req.s3_key, req.sheet_name)
     df = canonical_rename(df)
     _ensure_required_columns(df)
     _parse_dates(df)
 
-    # Filter Planning Whse (case-insensitive)
+    # Filter Planning Whse (case-insensitive, ignoring stray whitespace)
     whse_col = "Planning Whse"
     if whse_col not in df.columns:
         raise HTTPException(
             status_code=400, detail="Planning Whse column is required")
-    df_filtered = df[df[whse_col].astype(str).str.lower() == str(
-        req.planning_whse).strip().lower()].copy()
+    wanted = _normalize_whse([req.planning_whse]).iloc[0]
+    df_filtered = df[(_normalize_whse(df[whse_col]) == wanted).fillna(
+        False).to_numpy()].copy()
 
     # Apply defaults
-    weight_cfg = req.weight_config or WeightConfig(
-        texas_max=52000,
-        texas_min=47000,
-        other_max=48000,
-        other_min=44000,
-        load_target_pct=0.98,
-    )
+    # Field defaults, left unset so WEIGHT_RULES_PATH rules can override them
+    weight_cfg = req.weight_config or WeightConfig()
 
     # Assign priorities
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     # per clarification: pairing for shipments going out tomorrow
     ship_date = today + timedelta(days=1)
     df_b = _assign_priority_buckets(df_filtered, today)
+    # Resolve lane weight limits for every row in one join before packing
+    df_b = apply_weight_limits(df_b, weight_cfg)
 
     # Sorting per PRD primary order
-    sort_cols = ["priorityRank"]
-    if "Zone" in df_b.columns:
-        sort_cols.append("Zone")
-    if "Route" in df_b.columns:
-        sort_cols.append("Route")
-    sort_cols += ["Customer", "shipping_state", "shipping_city"]
-    df_b = df_b.sort_values(by=sort_cols, kind="mergesort")
-
-    # Grouping by zone/route/customer/destination
-    group_keys = []
-    if "Zone" in df_b.columns:
-        group_keys.append("Zone")
-    if "Route" in df_b.columns:
-        group_keys.append("Route")
-    group_keys += ["Customer", "shipping_state", "shipping_city"]
+    group_keys = _group_keys(df_b)
+    df_b = df_b.sort_values(by=["priorityRank", *group_keys], kind="mergesort")
 
     all_trucks: List[TruckSummary] = []
     all_assignments: List[LineAssignment] = []
@@ -337,7 +332,7 @@ def optimize(req: OptimizeRequest) -> OptimizeResponse:
     truck_counter = 1
     for _, gdf in df_b.groupby(group_keys, dropna=False):
         trucks, assigns, ordered_sections = _pack_trucks_for_group(
-            gdf, weight_cfg, req.allow_multi_stop, ship_date)
+            gdf, req.allow_multi_stop, ship_date)
         # Map old -> new numbers
         num_map: Dict[int, int] = {}
         for t in trucks:
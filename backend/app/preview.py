@@ -1,52 +1,92 @@
 from __future__ import annotations
 
-import io
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, List
 
-import boto3
+import numpy as np
 import pandas as pd
-from fastapi import HTTPException
-from pydantic import BaseModel
 
-from .config import get_settings
 from .constants import REQUIRED_COLUMNS
+from .models import (AggregateStat, PreviewAnalytics, PreviewRequest, PreviewResponse,
+                     WeightConfig)
+from .optimizer import (DATE_COLUMNS, PRIORITY_BUCKETS, _assign_priority_buckets,
+                        _group_keys, _load_excel, _normalize_whse, _parse_dates)
 from .utils import map_headers, canonical_rename
+from .weight_rules import apply_weight_limits
 
 
-class PreviewRequest(BaseModel):
-    s3_key: str
-    sheet_name: Optional[str] = None
-    max_sample_rows: int = 5
+# Label for rows whose warehouse/state cell is empty
+MISSING_KEY = "(missing)"
 
 
-class PreviewResponse(BaseModel):
-    headers: List[str]
-    rowCount: int
-    missingRequiredColumns: List[str]
-    sample: List[Dict]
+def _label(values) -> pd.Series:
+    s = pd.Series(values).astype("string").str.strip().str.upper()
+    return s.mask(s.isna() | (s == ""), MISSING_KEY).astype(object)
+
+
+def _aggregate(weight: pd.Series, key: pd.Series) -> Dict[str, AggregateStat]:
+    g = weight.groupby(key).agg(["size", "sum"])
+    return {str(k): AggregateStat(lines=int(r["size"]), readyWeight=float(r["sum"]))
+            for k, r in g.iterrows()}
+
+
+def _aggregate_by_whse(weight: pd.Series, whse: pd.Series, key: pd.Series,
+                       order: List[str]) -> Dict[str, Dict[str, AggregateStat]]:
+    g = weight.groupby([whse, key]).agg(["size", "sum"])
+    out: Dict[str, Dict[str, AggregateStat]] = {}
+    for w in g.index.get_level_values(0).unique():
+        sub = g.xs(w, level=0).reindex(order, fill_value=0)
+        out[str(w)] = {str(k): AggregateStat(lines=int(r["size"]), readyWeight=float(r["sum"]))
+                       for k, r in sub.iterrows()}
+    return out
+
+
+def _preview_analytics(df: pd.DataFrame, cfg: WeightConfig) -> PreviewAnalytics:
+    # Shallow copy: derived columns must not leak into the sample rows
+    work = df.copy(deep=False)
+    raw_dates = {c: work[c] for c in DATE_COLUMNS if c in work.columns}
+    _parse_dates(work)
+    unparseable = {c: int((raw.notna() & work[c].isna()).sum())
+                   for c, raw in raw_dates.items()}
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    work = _assign_priority_buckets(work, today)
+    work = apply_weight_limits(work, cfg)
+
+    work["_weight"] = pd.to_numeric(
+        work["Ready Weight"], errors="coerce").fillna(0.0)
+    pieces = pd.to_numeric(work["RPcs"], errors="coerce").fillna(0)
+    # Same normalization /optimize filters on, so keys can be sent back as planning_whse
+    work["_whse"] = _normalize_whse(
+        work["Planning Whse"]).fillna(MISSING_KEY).astype(object)
+
+    per_group = work.groupby(["_whse", *_group_keys(work)], dropna=False).agg(
+        weight=("_weight", "sum"), maxWeight=("maxWeight", "first"))
+    per_group["trucks"] = np.ceil(
+        per_group["weight"] / per_group["maxWeight"]).astype("int64")
+    whse_level = per_group.index.get_level_values("_whse")
+    states = _label(per_group.index.get_level_values("shipping_state")).to_numpy()
+    trucks = per_group["trucks"].groupby([whse_level, states]).sum()
+    trucks_by_whse_state: Dict[str, Dict[str, int]] = {}
+    for (w, st), n in trucks.items():
+        trucks_by_whse_state.setdefault(str(w), {})[str(st)] = int(n)
+    groups_by_whse = per_group.groupby(level="_whse").size()
+
+    return PreviewAnalytics(
+        byWarehouse=_aggregate(work["_weight"], work["_whse"]),
+        byWarehouseBucket=_aggregate_by_whse(
+            work["_weight"], work["_whse"], work["priorityBucket"], PRIORITY_BUCKETS),
+        groupCount=int(len(per_group)),
+        groupCountByWarehouse={str(k): int(v)
+                               for k, v in groups_by_whse.items()},
+        estimatedTrucksByWarehouseState=trucks_by_whse_state,
+        nonPositivePieces=int((pieces <= 0).sum()),
+        unparseableDates=unparseable,
+    )
 
 
 def generate_preview(req: PreviewRequest) -> PreviewResponse:
-    settings = get_settings()
-    if not settings.aws_s3_bucket_uploads:
-        raise HTTPException(
-            status_code=503, detail="AWS_S3_BUCKET_UPLOADS not configured")
-
-    s3 = boto3.client("s3", region_name=settings.aws_region)
-    try:
-        obj = s3.get_object(
-            Bucket=settings.aws_s3_bucket_uploads, Key=req.s3_key)
-        data = obj["Body"].read()
-    except Exception as e:
-        raise HTTPException(
-            status_code=404, detail=f"File not found or not accessible: {e}")
-
-    try:
-        excel = pd.ExcelFile(io.BytesIO(data))
-        df = excel.parse(req.sheet_name) if req.sheet_name else excel.parse(
-            excel.sheet_names[0])
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid Excel file: {e}")
+    df = _load_excel(req.s3_key, req.sheet_name)
 
     df = canonical_rename(df)
     headers = list(df.columns.astype(str))
@@ -65,9 +105,16 @@ def generate_preview(req: PreviewRequest) -> PreviewResponse:
         else []
     )
 
+    analytics = None
+    # Analytics reuse the optimizer's derived columns, which need exact names
+    has_required = all(c in df.columns for c in REQUIRED_COLUMNS)
+    if req.include_analytics and has_required and not df.empty:
+        analytics = _preview_analytics(df, req.weight_config or WeightConfig())
+
     return PreviewResponse(
         headers=headers,
         rowCount=int(len(df)),
         missingRequiredColumns=missing,
         sample=sample_rows,
+        analytics=analytics,
     )
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, Request, Response
+
+from .concurrency import overlap_peak, reset_overlap
+from .config import get_settings
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SKIPPED_HEADER = "X-Profile-Skipped"
+
+logger = logging.getLogger(__name__)
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# cProfile only sees the calling thread, but tracemalloc counts allocations from
+# every thread; one profile at a time, and the summary records how many other
+# heavy requests overlapped it
+_profile_lock = threading.Lock()
+
+
+def profiling_requested(request: Request) -> bool:
+    """True only when profiling is enabled in config and the caller asked for it."""
+    if not get_settings().profiling_enabled:
+        return False
+    flag = request.headers.get(PROFILE_HEADER) or request.query_params.get("profile")
+    return (flag or "").strip().lower() in {"1", "true", "yes"}
+
+
+def _profile_dir() -> str:
+    path = get_settings().profile_dir or os.path.join(
+        tempfile.gettempdir(), "truck-planner-profiles")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _prune(path: str, keep: int):
+    files = [os.path.join(path, f)
+             for f in os.listdir(path) if f.endswith(".prof")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for old in files[keep:]:
+        for p in (old, old[:-len(".prof")] + ".json"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+def _save(profile_id: str, name: str, prof: cProfile.Profile, duration_s: float,
+          peak_bytes: int, snapshot: Optional[tracemalloc.Snapshot],
+          concurrent: int) -> None:
+    settings = get_settings()
+    path = _profile_dir()
+    prof.dump_stats(os.path.join(path, f"{profile_id}.prof"))
+
+    text = io.StringIO()
+    pstats.Stats(prof, stream=text).sort_stats(
+        "cumulative").print_stats(30)
+    top_allocations = []
+    if snapshot is not None:
+        for stat in snapshot.statistics("lineno")[:15]:
+            frame = stat.traceback[0]
+            top_allocations.append({
+                "file": frame.filename,
+                "line": frame.lineno,
+                "sizeBytes": stat.size,
+                "count": stat.count,
+            })
+    summary = {
+        "id": profile_id,
+        "endpoint": name,
+        "createdAt": int(time.time()),
+        "durationMs": int(duration_s * 1000),
+        "tracemallocPeakBytes": peak_bytes,
+        # Other governed computations running at some point during the profile;
+        # when > 0 the tracemalloc numbers include their allocations too
+        "concurrentHeavyRequests": concurrent,
+        "topAllocations": top_allocations,
+        "cumulative": text.getvalue(),
+    }
+    with open(os.path.join(path, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f)
+    _prune(path, settings.profile_max_keep)
+
+
+def run_profiled(request: Request, response: Response, name: str,
+                 fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Call fn, capturing cProfile + tracemalloc when the request opts in.
+
+    With profiling off this is a plain call. The profile id is returned in the
+    X-Profile-Id header (on the returned Response if fn produced one); if the
+    profile could not be taken, X-Profile-Skipped says why.
+    """
+    if not profiling_requested(request):
+        return fn(*args, **kwargs)
+    if not _profile_lock.acquire(blocking=False):
+        # Another request is being profiled; serve this one and say so
+        result = fn(*args, **kwargs)
+        _target(result, response).headers[PROFILE_SKIPPED_HEADER] = "busy"
+        return result
+
+    profile_id = uuid.uuid4().hex
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    else:
+        tracemalloc.reset_peak()
+    reset_overlap()
+    prof = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        prof.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            duration = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            # The profiled request itself runs inside a governor slot
+            concurrent = max(0, overlap_peak() - 1)
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                _save(profile_id, name, prof, duration,
+                      peak, snapshot, concurrent)
+                saved = True
+            except Exception:
+                # Never fail the request over the profile artifact
+                logger.exception("Failed to save profile %s", profile_id)
+                saved = False
+    finally:
+        _profile_lock.release()
+
+    target = _target(result, response)
+    if saved:
+        target.headers[PROFILE_ID_HEADER] = profile_id
+    else:
+        target.headers[PROFILE_SKIPPED_HEADER] = "save-failed"
+    return result
+
+
+def _target(result: Any, response: Response) -> Response:
+    return result if isinstance(result, Response) else response
+
+
+def profile_headers(response: Response) -> Dict[str, str]:
+    """Profile headers set by run_profiled, for callers building their own Response."""
+    return {h: response.headers[h] for h in (PROFILE_ID_HEADER, PROFILE_SKIPPED_HEADER)
+            if h in response.headers}
+
+
+def profile_paths(profile_id: str) -> Dict[str, str]:
+    if not get_settings().profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not _ID_RE.match(profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    path = _profile_dir()
+    paths = {
+        "pstats": os.path.join(path, f"{profile_id}.prof"),
+        "summary": os.path.join(path, f"{profile_id}.json"),
+    }
+    if not all(os.path.exists(p) for p in paths.values()):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return paths
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from .models import LineAssignment, OptimizeResponse, TruckSummary
+
+
+def _norm(value) -> Optional[str]:
+    """Index key form: trimmed, case-folded, Excel float suffix dropped (2.0 -> 2)."""
+    if value is None:
+        return None
+    v = str(value).strip().lower()
+    if v.endswith(".0") and v[:-2].lstrip("-").isdigit():
+        v = v[:-2]
+    return v or None
+
+
+class _Table:
+    """Column-per-field copy of a list of models; rows become models only on read.
+
+    Plain int/float/bool fields are packed into arrays, everything else into
+    tuples with repeated strings shared, which is far smaller than keeping one
+    pydantic object per row.
+    """
+
+    _ARRAY_TYPES = {int: "q", float: "d", bool: "b"}
+
+    def __init__(self, model: Type[BaseModel], items: Sequence[BaseModel]):
+        self.model = model
+        self.size = len(items)
+        self.columns: Dict[str, Sequence] = {}
+        self._bools: List[str] = []
+        strings: Dict[str, str] = {}
+        for name, field in model.model_fields.items():
+            values = [getattr(item, name) for item in items]
+            typecode = self._ARRAY_TYPES.get(field.annotation)
+            if typecode is not None:
+                self.columns[name] = array(typecode, values)
+                if field.annotation is bool:
+                    self._bools.append(name)
+            else:
+                self.columns[name] = tuple(
+                    strings.setdefault(v, v) if isinstance(v, str) else v for v in values)
+
+    def column(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def row(self, pos: int) -> BaseModel:
+        data = {name: col[pos] for name, col in self.columns.items()}
+        for name in self._bools:
+            data[name] = bool(data[name])
+        # Values were validated when the run was produced
+        return self.model.model_construct(**data)
+
+    def rows(self, positions: Sequence[int]) -> Iterator[BaseModel]:
+        for pos in positions:
+            yield self.row(pos)
+
+
+class _Field:
+    """Each row's key code, plus posting lists packed into one sorted array."""
+
+    def __init__(self, keys: Sequence):
+        self.codes: Dict[object, int] = {}
+        self.keys = np.fromiter(
+            (-1 if k is None else self.codes.setdefault(k, len(self.codes)) for k in keys),
+            dtype=np.int32, count=len(keys))
+        # Stable sort keeps every posting list in row order
+        self._order = np.argsort(self.keys, kind="stable").astype(np.int32)
+        self._starts = np.searchsorted(
+            self.keys[self._order], np.arange(len(self.codes) + 1))
+
+    def code(self, key) -> int:
+        return self.codes.get(key, -2)
+
+    def postings(self, key) -> np.ndarray:
+        c = self.codes.get(key)
+        if c is None:
+            return self._order[:0]
+        return self._order[self._starts[c]:self._starts[c + 1]]
+
+
+def _select(filters: List[Tuple[_Field, object]], total: int) -> Sequence[int]:
+    """Start from the shortest posting list and narrow it by the other filters."""
+    if not filters:
+        return range(total)
+    filters = sorted(filters, key=lambda f: len(f[0].postings(f[1])))
+    field, key = filters[0]
+    candidates = field.postings(key)
+    for f, k in filters[1:]:
+        candidates = candidates[f.keys[candidates] == f.code(k)]
+    return candidates
+
+
+class RunIndex:
+    """Columnar copy of one optimization result plus lookup tables, built once
+    when the run completes; the OptimizeResponse itself is not kept."""
+
+    def __init__(self, run_id: str, result: OptimizeResponse):
+        self.run_id = run_id
+        self.trucks_table = _Table(TruckSummary, result.trucks)
+        self.assignments_table = _Table(LineAssignment, result.assignments)
+        t = self.trucks_table.column
+        a = self.assignments_table.column
+
+        self.truck_pos: Dict[int, int] = {
+            n: i for i, n in enumerate(t("truckNumber"))}
+        truck_zone = dict(zip(t("truckNumber"), map(_norm, t("zone"))))
+        truck_route = dict(zip(t("truckNumber"), map(_norm, t("route"))))
+        truck_section = dict(
+            zip(t("truckNumber"), map(_norm, t("priorityBucket"))))
+
+        self.a_so = _Field([_norm(v) for v in a("so")])
+        self.a_line = _Field([_norm(v) for v in a("line")])
+        self.a_customer = _Field([_norm(v) for v in a("customerName")])
+        self.a_truck = _Field(a("truckNumber"))
+        self.a_bucket = _Field([_norm(v) for v in a("priorityBucket")])
+        # Section = the bucket of the truck a line rides on
+        self.a_section = _Field([truck_section.get(n) for n in a("truckNumber")])
+        self.a_zone = _Field([truck_zone.get(n) for n in a("truckNumber")])
+        self.a_route = _Field([truck_route.get(n) for n in a("truckNumber")])
+
+        self.t_customer = _Field([_norm(v) for v in t("customerName")])
+        self.t_bucket = _Field([_norm(v) for v in t("priorityBucket")])
+        self.t_zone = _Field([_norm(v) for v in t("zone")])
+        self.t_route = _Field([_norm(v) for v in t("route")])
+
+    @property
+    def size(self) -> int:
+        return self.assignments_table.size
+
+    def assignments(self, so: Optional[str] = None, line: Optional[str] = None,
+                    customer: Optional[str] = None, truck: Optional[int] = None,
+                    bucket: Optional[str] = None, zone: Optional[str] = None,
+                    route: Optional[str] = None, section: Optional[str] = None) -> Sequence[int]:
+        filters: List[Tuple[_Field, object]] = []
+        if so is not None:
+            filters.append((self.a_so, _norm(so)))
+            if line is not None:
+                filters.append((self.a_line, _norm(line)))
+        elif line is not None:
+            raise HTTPException(
+                status_code=400, detail="line filter requires so")
+        if customer is not None:
+            filters.append((self.a_customer, _norm(customer)))
+        if truck is not None:
+            filters.append((self.a_truck, truck))
+        if bucket is not None:
+            filters.append((self.a_bucket, _norm(bucket)))
+        if section is not None:
+            filters.append((self.a_section, _norm(section)))
+        if zone is not None:
+            filters.append((self.a_zone, _norm(zone)))
+        if route is not None:
+            filters.append((self.a_route, _norm(route)))
+        return _select(filters, self.assignments_table.size)
+
+    def trucks(self, customer: Optional[str] = None, bucket: Optional[str] = None,
+               zone: Optional[str] = None, route: Optional[str] = None) -> Sequence[int]:
+        filters: List[Tuple[_Field, object]] = []
+        if customer is not None:
+            filters.append((self.t_customer, _norm(customer)))
+        if bucket is not None:
+            filters.append((self.t_bucket, _norm(bucket)))
+        if zone is not None:
+            filters.append((self.t_zone, _norm(zone)))
+        if route is not None:
+            filters.append((self.t_route, _norm(route)))
+        return _select(filters, self.trucks_table.size)
+
+    def truck(self, truck_number: int) -> Tuple[TruckSummary, List[LineAssignment]]:
+        pos = self.truck_pos.get(truck_number)
+        if pos is None:
+            raise HTTPException(status_code=404, detail="Truck not found")
+        lines = list(self.assignments_table.rows(
+            self.a_truck.postings(truck_number)))
+        return self.trucks_table.row(pos), lines
+
+
+class RunStore:
+    """Keeps recent runs (and their indexes) in memory, bounded by total assignments.
+
+    Runs are held in columnar form (about 0.3 KB per assignment with its
+    index, ~25 MB for a 100k-line run), and the budget is counted in
+    assignments rather than runs. Runs live only in the process that
+    produced them; with several tasks behind a load balancer, /runs requests
+    must be routed to the same task (ALB stickiness).
+    """
+
+    def __init__(self, max_assignments: int):
+        self.max_assignments = max(1, max_assignments)
+        self._runs: "OrderedDict[str, RunIndex]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def add(self, result: OptimizeResponse) -> Optional[str]:
+        """Store the run and return its id, or None if it alone exceeds the budget."""
+        if max(1, len(result.assignments)) > self.max_assignments:
+            return None
+        run_id = uuid.uuid4().hex
+        index = RunIndex(run_id, result)
+        size = max(1, index.size)
+        with self._lock:
+            self._runs[run_id] = index
+            self._sizes[run_id] = size
+            self._total += size
+            while self._total > self.max_assignments:
+                old_id, _ = self._runs.popitem(last=False)
+                self._total -= self._sizes.pop(old_id)
+        return run_id
+
+    def get(self, run_id: str) -> RunIndex:
+        with self._lock:
+            index = self._runs.get(run_id)
+            if index is not None:
+                self._runs.move_to_end(run_id)
+        if index is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Run not found or expired (runs are kept in memory on the task that produced them)")
+        return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"runs": len(self._runs), "assignments": self._total,
+                    "maxAssignments": self.max_assignments}
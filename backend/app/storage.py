@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import io
+import mmap
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, ContextManager, Iterator, Optional
+
+from fastapi import HTTPException
+
+from .config import get_settings
+
+
+class StorageBackend(ABC):
+    """Read-only access to uploaded files, keyed like S3 object keys."""
+
+    name = "base"
+
+    @abstractmethod
+    def open(self, key: str) -> ContextManager[BinaryIO]:
+        """Context manager yielding a seekable binary file object for the whole file."""
+
+    @abstractmethod
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        ...
+
+    @abstractmethod
+    def fingerprint(self, key: str) -> str:
+        """Cheap change marker (ETag / mtime+size) without reading the body."""
+
+    def cache_key(self, key: str) -> str:
+        """Identifies this exact file version, e.g. for single-flight keys."""
+        return f"{self.name}:{key}:{self.fingerprint(key)}"
+
+
+class S3Storage(StorageBackend):
+    name = "s3"
+
+    def __init__(self, bucket: str, region: str):
+        import boto3
+
+        self.bucket = bucket
+        self._s3 = boto3.client("s3", region_name=region)
+
+    def _get(self, key: str, **kwargs) -> bytes:
+        try:
+            obj = self._s3.get_object(Bucket=self.bucket, Key=key, **kwargs)
+            return obj["Body"].read()
+        except Exception as e:
+            raise HTTPException(
+                status_code=404, detail=f"File not found or not accessible: {e}")
+
+    @contextmanager
+    def open(self, key: str) -> Iterator[BinaryIO]:
+        yield io.BytesIO(self._get(key))
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        return self._get(key, Range=f"bytes={start}-{start + length - 1}")
+
+    def fingerprint(self, key: str) -> str:
+        try:
+            head = self._s3.head_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            raise HTTPException(
+                status_code=404, detail=f"File not found or not accessible: {e}")
+        return str(head.get("ETag", "")).strip('"')
+
+
+class _MappedFile(io.RawIOBase):
+    """Seekable file view over an mmap; pandas/zipfile read it without a full copy."""
+
+    def __init__(self, mm: mmap.mmap):
+        super().__init__()
+        self._mm = mm
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._mm.read(None if size is None or size < 0 else size)
+
+    def readinto(self, b) -> int:
+        data = self._mm.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._mm.seek(offset, whence)
+        return self._mm.tell()
+
+    def tell(self) -> int:
+        return self._mm.tell()
+
+
+class LocalStorage(StorageBackend):
+    """Files under a root directory; reads are memory-mapped, not copied."""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, key.lstrip("/\\")))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise HTTPException(status_code=400, detail="Invalid file key")
+        if not os.path.isfile(path):
+            raise HTTPException(
+                status_code=404, detail=f"File not found or not accessible: {key}")
+        return path
+
+    @contextmanager
+    def open(self, key: str) -> Iterator[BinaryIO]:
+        path = self._path(key)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap cannot map an empty file
+                yield io.BytesIO(b"")
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield _MappedFile(mm)
+            finally:
+                try:
+                    mm.close()
+                except BufferError:
+                    # A reader still holds a view; the map is freed with it
+                    pass
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            return f.read(max(0, length))
+
+    def fingerprint(self, key: str) -> str:
+        st = os.stat(self._path(key))
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> StorageBackend:
+    settings = get_settings()
+    backend = (settings.storage_backend or "s3").strip().lower()
+    if backend == "local":
+        if not settings.local_storage_root:
+            raise HTTPException(
+                status_code=503, detail="LOCAL_STORAGE_ROOT not configured")
+        return LocalStorage(settings.local_storage_root)
+    if backend == "s3":
+        if not settings.aws_s3_bucket_uploads:
+            raise HTTPException(
+                status_code=503, detail="AWS_S3_BUCKET_UPLOADS not configured")
+        return S3Storage(settings.aws_s3_bucket_uploads, settings.aws_region)
+    raise HTTPException(
+        status_code=503, detail=f"Unknown STORAGE_BACKEND: {settings.storage_backend}")
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+from typing import Dict, Optional
+
+# Heavy modules the request paths need; imported off the startup path so
+# /health answers as soon as the app object exists.
+WARM_MODULES = [
+    "pandas",
+    "openpyxl",
+    "boto3",
+    f"{__package__}.storage",
+    "psycopg",
+    f"{__package__}.optimizer",
+    f"{__package__}.preview",
+    f"{__package__}.exporter",
+]
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_timings_ms: Dict[str, int] = {}
+_errors: Dict[str, str] = {}
+_started_at: Optional[float] = None
+_finished_at: Optional[float] = None
+
+
+def _run():
+    global _finished_at
+    for name in WARM_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            _errors[name] = str(e)
+        _timings_ms[name] = int((time.perf_counter() - start) * 1000)
+    _finished_at = time.perf_counter()
+
+
+def start_warmup() -> None:
+    """Import heavy modules in a background thread (idempotent)."""
+    global _thread, _started_at
+    with _lock:
+        if _thread is not None:
+            return
+        _started_at = time.perf_counter()
+        _thread = threading.Thread(
+            target=_run, name="app-warmup", daemon=True)
+        _thread.start()
+
+
+def is_ready() -> bool:
+    return _finished_at is not None and not _errors
+
+
+def status() -> dict:
+    total_ms = None
+    if _started_at is not None and _finished_at is not None:
+        total_ms = int((_finished_at - _started_at) * 1000)
+    return {
+        "ready": is_ready(),
+        "started": _started_at is not None,
+        "finished": _finished_at is not None,
+        "totalMs": total_ms,
+        "modulesMs": dict(_timings_ms),
+        "errors": dict(_errors),
+    }
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from .config import get_settings
+from .models import WeightConfig, WeightRule
+
+# Location keys in match order; "state" is "*" for fallback rules
+_LOCATION_KEYS = ("state", "zone", "route")
+
+
+@dataclass(frozen=True)
+class CompiledWeightRules:
+    # Lookup tables ordered most specific first; each is keyed by `keys`
+    levels: Tuple[Tuple[Tuple[str, ...], pd.DataFrame], ...]
+    # (min, max, target_pct) used when no keyed table matches
+    fallback: Tuple[int, int, Optional[float]]
+
+
+@lru_cache(maxsize=1)
+def get_configured_rules() -> Tuple[WeightRule, ...]:
+    """Load WEIGHT_RULES_PATH once and validate it."""
+    path = get_settings().weight_rules_path
+    if not path:
+        return tuple()
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    rules = WeightConfig(rules=raw).rules
+    return tuple(rules)
+
+
+def resolve_rules(cfg: WeightConfig) -> Tuple[WeightRule, ...]:
+    """Merge rule sources; for the same key the first source wins.
+
+    Order: request rules, TX/other values the request set explicitly,
+    WEIGHT_RULES_PATH rules, then the TX/other defaults. Source order only
+    settles identical keys; between different keys the more specific rule
+    wins (see compile_rules).
+    """
+    texas = WeightRule(state="TX", min_weight=cfg.texas_min,
+                       max_weight=cfg.texas_max)
+    other = WeightRule(state="*", min_weight=cfg.other_min,
+                       max_weight=cfg.other_max)
+    explicit, defaults = [], []
+    sent = cfg.model_fields_set
+    (explicit if sent & {"texas_min", "texas_max"} else defaults).append(texas)
+    (explicit if sent & {"other_min", "other_max"} else defaults).append(other)
+    try:
+        configured = get_configured_rules()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Invalid weight rules configuration: {e}")
+    merged: Dict[tuple, WeightRule] = {}
+    for rule in [*cfg.rules, *explicit, *configured, *defaults]:
+        merged.setdefault(rule.key(), rule)
+    return tuple(merged.values())
+
+
+def _specificity(level: Tuple[Tuple[str, ...], bool]) -> tuple:
+    # More location keys first, then permit-specific, then state > zone > route
+    keys, has_permit = level
+    return (len(keys), has_permit, tuple(k in keys for k in _LOCATION_KEYS))
+
+
+@lru_cache(maxsize=32)
+def compile_rules(rules: Tuple[WeightRule, ...], permit_class: Optional[str]) -> CompiledWeightRules:
+    permit = (permit_class or "").strip() or None
+    buckets: Dict[Tuple[Tuple[str, ...], bool], List[dict]] = {}
+    fallback: Optional[Tuple[int, int, Optional[float]]] = None
+    fallback_permit = False
+    for rule in rules:
+        if rule.permit_class is not None and rule.permit_class != permit:
+            continue
+        has_permit = rule.permit_class is not None
+        keys = tuple(k for k in _LOCATION_KEYS
+                     if getattr(rule, k) is not None and getattr(rule, k) != "*")
+        limits = (rule.min_weight, rule.max_weight, rule.load_target_pct)
+        if not keys:
+            if fallback is None or (has_permit and not fallback_permit):
+                fallback, fallback_permit = limits, has_permit
+            continue
+        row = {k: getattr(rule, k) for k in keys}
+        row.update(minWeight=limits[0], maxWeight=limits[1],
+                   targetPct=limits[2])
+        buckets.setdefault((keys, has_permit), []).append(row)
+
+    if fallback is None:
+        raise HTTPException(
+            status_code=500, detail="Weight rules have no '*' fallback")
+
+    ordered = sorted(buckets.items(),
+                     key=lambda kv: _specificity(kv[0]), reverse=True)
+    levels = tuple(
+        (keys, pd.DataFrame(rows).drop_duplicates(subset=list(keys)))
+        for (keys, _), rows in ordered
+    )
+    return CompiledWeightRules(levels=levels, fallback=fallback)
+
+
+_KEY_SOURCES = {"state": "shipping_state", "zone": "Zone", "route": "Route"}
+
+
+def _normalize_key(value, upper: bool) -> Optional[str]:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    v = str(value).strip()
+    # Excel often hands zone/route back as floats (2.0); match "2"
+    if v.endswith(".0") and v[:-2].lstrip("-").isdigit():
+        v = v[:-2]
+    if upper:
+        v = v.upper()
+    return v or None
+
+
+def _lookup_keys(df: pd.DataFrame, needed: Iterable[str]) -> pd.DataFrame:
+    """Normalized key columns, computed once per distinct value, not per row."""
+    keys = pd.DataFrame(index=df.index)
+    for name in needed:
+        source = _KEY_SOURCES[name]
+        if source not in df.columns:
+            keys[name] = pd.Series(None, index=df.index, dtype="object")
+            continue
+        codes, uniques = pd.factorize(df[source])
+        # Extra trailing slot so code -1 (missing) maps to None
+        mapped = np.array([_normalize_key(u, name == "state") for u in uniques] + [None],
+                          dtype=object)
+        keys[name] = mapped[codes]
+    return keys
+
+
+def apply_weight_limits(df: pd.DataFrame, cfg: WeightConfig) -> pd.DataFrame:
+    """Attach minWeight/maxWeight/targetWeight columns via vectorized joins."""
+    compiled = compile_rules(resolve_rules(cfg), cfg.permit_class)
+    # Only normalize the key columns some rule level actually joins on
+    needed = [k for k in _LOCATION_KEYS
+              if any(k in level_keys for level_keys, _ in compiled.levels)]
+    keys = _lookup_keys(df, needed)
+    cols = ["minWeight", "maxWeight", "targetPct"]
+    limits = pd.DataFrame(index=df.index, columns=cols, dtype="float64")
+    for level_keys, table in compiled.levels:
+        pending = limits["maxWeight"].isna()
+        if not pending.any():
+            break
+        hit = keys.loc[pending, list(level_keys)].merge(
+            table, on=list(level_keys), how="left")
+        limits.loc[pending, cols] = hit[cols].to_numpy(dtype="float64")
+
+    fb_min, fb_max, fb_pct = compiled.fallback
+    unmatched = limits["maxWeight"].isna()
+    limits.loc[unmatched, "minWeight"] = fb_min
+    limits.loc[unmatched, "maxWeight"] = fb_max
+    if fb_pct is not None:
+        limits.loc[unmatched, "targetPct"] = fb_pct
+    limits["targetPct"] = limits["targetPct"].fillna(cfg.load_target_pct)
+
+    # Shallow copy: new columns only, the order data is shared
+    out = df.copy(deep=False)
+    out["minWeight"] = limits["minWeight"].astype("int64")
+    out["maxWeight"] = limits["maxWeight"].astype("int64")
+    out["targetWeight"] = (limits["maxWeight"] *
+                           limits["targetPct"]).astype("int64")
+    return out
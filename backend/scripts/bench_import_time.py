@@ -0,0 +1,96 @@
+"""Startup import-time benchmark.
+
+Run from backend/:  python scripts/bench_import_time.py [--top 15] [--json]
+
+Reports `python -X importtime` for `import app.main` (what must load before
+/health can answer) and, in a separate interpreter without app.main, for the
+heavy modules warmed in the background, with a per-module breakdown.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _importtime(code: str) -> List[Dict]:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        raise SystemExit("\n".join(tail[-20:]) or f"exit code {proc.returncode}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            # Nesting depth is encoded as two spaces per level
+            "depth": (len(name) - len(name.lstrip(" ")) - 1) // 2,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return rows
+
+
+def _summary(rows: List[Dict], top: int) -> Dict:
+    top_level = [r for r in rows if r["depth"] == 0]
+    return {
+        "total_ms": round(sum(r["cumulative_us"] for r in top_level) / 1000, 1),
+        "top": [
+            {"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1)}
+            for r in sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    # app.warmup only needs the stdlib, so reading the list here is cheap
+    sys.path.insert(0, BACKEND_DIR)
+    from app.warmup import WARM_MODULES
+
+    # Plain import statements: importlib.import_module is not timed by -X importtime
+    warm_rows = _importtime("\n".join(f"import {m}" for m in WARM_MODULES))
+    warm = _summary(warm_rows, args.top)
+    # Each warm module is imported first at depth 0 in its own interpreter;
+    # its cumulative time is its standalone cost given the ones before it
+    first = {}
+    for r in warm_rows:
+        if r["depth"] == 0 and r["module"] in WARM_MODULES:
+            first.setdefault(r["module"], r["cumulative_us"])
+    warm["per_module"] = [
+        {"module": m, "cumulative_ms": round(first.get(m, 0) / 1000, 1)}
+        for m in WARM_MODULES
+    ]
+    results = {
+        "app.main": _summary(_importtime("import app.main"), args.top),
+        "warm_modules": warm,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for label, res in results.items():
+        print(f"== {label}: {res['total_ms']} ms total")
+        for r in res["top"]:
+            print(f"  {r['cumulative_ms']:>9.1f} ms  {r['module']}")
+        if "per_module" in res:
+            print(f"-- {label} per module (in warm-up order)")
+            for r in res["per_module"]:
+                print(f"  {r['cumulative_ms']:>9.1f} ms  {r['module']}")
+
+
+if __name__ == "__main__":
+    main()